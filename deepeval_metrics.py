@@ -1,40 +1,140 @@
-from deepeval.metrics.dag import (
-    DeepAcyclicGraph,
-    TaskNode,
-    BinaryJudgementNode,
-    NonBinaryJudgementNode,
-    VerdictNode,
-)
 from deepeval.metrics import (
     BaseMetric,
     AnswerRelevancyMetric,
     GEval,
-    DAGMetric,
     FaithfulnessMetric,
     HallucinationMetric
 )
-from deepeval.test_case import LLMTestCaseParams
-from typing import Optional, Union, Iterable, List, Dict
+from deepeval.test_case import LLMTestCase, LLMTestCaseParams
+from typing import Any, Optional, Union, Iterable, List, Dict, Mapping, Sequence, Tuple
+import asyncio
+import collections
+import copy
+import functools
+import hashlib
+import json
+import logging
+import os
 from deepeval.models.base_model import DeepEvalBaseLLM
 
+logger = logging.getLogger(__name__)
+
+# Judge rubrics, built once at import instead of on every get_metrics call
+_CORRECTNESS_CRITERIA = "Determine whether the actual output is factually correct based on the expected output."
+_CORRECTNESS_STEPS = (
+    "Check whether the actual output is either empty or explicitly states that the question cannot be answered with the given context. If the expected output also states that the question cannot be answered, assign the maximum score and skip further steps.",
+    "If the expected output provides an answer, verify whether the facts in 'actual output' contradict any facts in 'expected output'.",
+    "Heavily penalize omission of key details present in the expected output.",
+    "Vague language or contradicting OPINIONS are acceptable and should not be penalized.",
+    "If the expected output states that the question cannot be answered with the given context but the actual output attempts to provide an answer, apply a heavy penalty."
+)
+_SIA_CRITERIA = (
+    "Evaluate whether the actual output appropriately responds to the input question given the context, "
+    "without introducing specific information (e.g., names, places, numbers) that is not explicitly provided in the context. "
+    "Use the expected output to determine whether the model should answer the question or state that it cannot answer."
+)
+_SIA_STEPS = (
+    "Carefully read the context and identify all specific information (such as names, places, numbers) explicitly mentioned.",
+    "Review the expected output to understand whether the question is answerable given the context.",
+    "Analyze the actual output to see if it includes specific information not present in the context.",
+    "If the expected output indicates that the question cannot be answered:",
+    "    - If the actual output correctly states that it cannot answer the question with the given context or provides an appropriate non-informative response, assign the highest possible score.",
+    "    - If the actual output attempts to answer the question by introducing information not present in the context, assign the lowest possible score.",
+    "If the expected output indicates that the question can be answered:",
+    "    - If the actual output answers the question using only the information present in the context without adding any inferred or external information, assign a high score based on the answer's accuracy.",
+    "    - If the actual output includes any specific information (names, places, numbers) that is not present in the context, assign a lower score accordingly.",
+    "Provide a final score based on the above criteria, ensuring that the evaluation is consistent with the expected output."
+)
+
+def _hallucination_lower_is_better() -> bool:
+    """Older DeepEval releases score Hallucination as the fraction of contradicted contexts (lower is better)."""
+    probe = HallucinationMetric.__new__(HallucinationMetric)
+    probe.threshold, probe.score, probe.error = 0.5, 0.0, None
+    return bool(HallucinationMetric.is_successful(probe))
+
+_HALLUCINATION_LOWER_IS_BETTER = _hallucination_lower_is_better()
+
+if _HALLUCINATION_LOWER_IS_BETTER:
+    class FlippedHallucinationMetric(HallucinationMetric):
+        """
+            HallucinationMetric scored as 1 - hallucination, so that, like every other metric returned by
+            `get_metrics`, higher scores are better and a test case passes when score >= threshold.
+            e.g. threshold=0.8 only passes test cases with a raw hallucination score of at most 0.2.
+        """
+
+        def _flip(self):
+            if self.score is not None:
+                self.score = 1 - self.score
+                self.is_successful()
+
+        def measure(self, test_case: LLMTestCase, *args, **kwargs) -> float:
+            super().measure(test_case, *args, **kwargs)
+            # In async mode HallucinationMetric.measure delegates to a_measure, which has already flipped the score
+            if not self.async_mode:
+                self._flip()
+            return self.score
+
+        async def a_measure(self, test_case: LLMTestCase, *args, **kwargs) -> float:
+            await super().a_measure(test_case, *args, **kwargs)
+            self._flip()
+            return self.score
+
+        def is_successful(self) -> bool:
+            if self.error is not None:
+                self.success = False
+            else:
+                try:
+                    self.success = self.score >= self.threshold
+                except TypeError:
+                    self.success = False
+            return self.success
+else:
+    # Newer DeepEval releases already score Hallucination higher-is-better. They also look up prompt
+    # templates by metric class name, so a subclass would fail on every call: use the metric as is.
+    FlippedHallucinationMetric = HallucinationMetric
+
+# Thresholds used for the metrics missing from a `thresholds` mapping
+_DEFAULT_THRESHOLDS = {
+    'Correctness': 0.9,
+    'Specific Information Accuracy': 0.9,
+    'Answer Relevancy': 0.9,
+    'Faithfulness': 0.9,
+    'Hallucination': 0.8
+}
+
 def get_metrics(
         model: Optional[Union[str, DeepEvalBaseLLM]] = None,
-        thresholds: Union[float, Dict[str, float]] = 0.7,
+        thresholds: Union[float, Mapping[str, float]] = 0.7,
         include_reason: bool = False
-        ) -> List[BaseMetric]:
-    """Returns a list of metrics for evaluating language model performance."""
+        ) -> Tuple[BaseMetric, ...]:
+    """
+        Returns the metrics for evaluating language model performance.
+        Metrics are built once per (model, thresholds, include_reason) and the same instances are
+        returned to every caller, hence the tuple. Models are keyed by identity.
+        Metrics keep the result of their last `measure` on the instance: `evaluate_case`,
+        `evaluate_cases` and `dedupe_and_score` copy them, anything else measuring them
+        concurrently should `copy.copy` each metric first.
+    """
+    if not isinstance(thresholds, float):
+        thresholds = tuple(sorted(thresholds.items()))
+    return _build_metrics(model, thresholds, include_reason)
+
+@functools.lru_cache(maxsize=32)
+def _build_metrics(
+        model: Optional[Union[str, DeepEvalBaseLLM]],
+        thresholds: Union[float, Tuple[Tuple[str, float], ...]],
+        include_reason: bool
+        ) -> Tuple[BaseMetric, ...]:
+    if isinstance(thresholds, float):
+        thresholds = dict.fromkeys(_DEFAULT_THRESHOLDS, thresholds)
+    else:
+        thresholds = collections.ChainMap(dict(thresholds), _DEFAULT_THRESHOLDS)
 
     correctness_metric = GEval(
         name="Correctness",
-        threshold=thresholds if isinstance(thresholds, float) else thresholds.get('Correctness', 0.9),
-        criteria="Determine whether the actual output is factually correct based on the expected output.",
-        evaluation_steps=[
-            "Check whether the actual output is either empty or explicitly states that the question cannot be answered with the given context. If the expected output also states that the question cannot be answered, assign the maximum score and skip further steps.",
-            "If the expected output provides an answer, verify whether the facts in 'actual output' contradict any facts in 'expected output'.",
-            "Heavily penalize omission of key details present in the expected output.",
-            "Vague language or contradicting OPINIONS are acceptable and should not be penalized.",
-            "If the expected output states that the question cannot be answered with the given context but the actual output attempts to provide an answer, apply a heavy penalty."
-        ],
+        threshold=thresholds['Correctness'],
+        criteria=_CORRECTNESS_CRITERIA,
+        evaluation_steps=list(_CORRECTNESS_STEPS),
         evaluation_params=[
             LLMTestCaseParams.INPUT, 
             LLMTestCaseParams.ACTUAL_OUTPUT, 
@@ -45,24 +145,9 @@ def get_metrics(
     )
     specific_info_accuracy_metric = GEval(
         name="Specific Information Accuracy",
-        threshold=thresholds if isinstance(thresholds, float) else thresholds.get('Specific Information Accuracy', 0.9),
-        criteria=(
-            "Evaluate whether the actual output appropriately responds to the input question given the context, "
-            "without introducing specific information (e.g., names, places, numbers) that is not explicitly provided in the context. "
-            "Use the expected output to determine whether the model should answer the question or state that it cannot answer."
-        ),
-        evaluation_steps=[
-            "Carefully read the context and identify all specific information (such as names, places, numbers) explicitly mentioned.",
-            "Review the expected output to understand whether the question is answerable given the context.",
-            "Analyze the actual output to see if it includes specific information not present in the context.",
-            "If the expected output indicates that the question cannot be answered:",
-            "    - If the actual output correctly states that it cannot answer the question with the given context or provides an appropriate non-informative response, assign the highest possible score.",
-            "    - If the actual output attempts to answer the question by introducing information not present in the context, assign the lowest possible score.",
-            "If the expected output indicates that the question can be answered:",
-            "    - If the actual output answers the question using only the information present in the context without adding any inferred or external information, assign a high score based on the answer's accuracy.",
-            "    - If the actual output includes any specific information (names, places, numbers) that is not present in the context, assign a lower score accordingly.",
-            "Provide a final score based on the above criteria, ensuring that the evaluation is consistent with the expected output."
-        ],
+        threshold=thresholds['Specific Information Accuracy'],
+        criteria=_SIA_CRITERIA,
+        evaluation_steps=list(_SIA_STEPS),
         evaluation_params=[
             LLMTestCaseParams.INPUT,
             LLMTestCaseParams.ACTUAL_OUTPUT,
@@ -73,34 +158,338 @@ def get_metrics(
         _include_g_eval_suffix = False
     )
     answer_relevancy = AnswerRelevancyMetric(
-        threshold=thresholds if isinstance(thresholds, float) else thresholds.get('Answer Relevancy', 0.9),
+        threshold=thresholds['Answer Relevancy'],
         model=model,
         include_reason=include_reason
     )
     faithfulness_metric = FaithfulnessMetric(
-        threshold=thresholds if isinstance(thresholds, float) else thresholds.get('Faithfulness', 0.9),
+        threshold=thresholds['Faithfulness'],
         model=model,
         include_reason=include_reason
     )
-    hallucinationMetric = HallucinationMetric(
-        threshold=thresholds if isinstance(thresholds, float) else thresholds.get('Hallucination', 0.8),
+    hallucinationMetric = FlippedHallucinationMetric(
+        threshold=thresholds['Hallucination'],
         model=model,
         include_reason=include_reason
     )
-    """
-        NOTE:
-        DeepEval logs will show a different percentage of passed tests for Hallucination due to how this metric works.
-        For Hallucination, lower scores -> better performances
-        However we flip the score of this metric for easiness of comprehension of the results in the CSV and the 
-        flipped threshold is not handled here.
-        Just make sure to pass as threshold in the main the flipped threshold.
-        e.g. If you want to only pass tests with a low Hallucination score (0.2 for example), then pass 1 - 0.2 = 0.8 in the main function.
-    """
-    metrics = [
+    metrics = (
         correctness_metric,
         specific_info_accuracy_metric,
         answer_relevancy,
         faithfulness_metric,
         hallucinationMetric
-    ]
-    return metrics
\ No newline at end of file
+    )
+    return metrics
+
+
+def _normalize(value):
+    """Canonicalizes a test case field: whitespace is collapsed per string, lists stay lists, None stays None."""
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return " ".join(str(value).split())
+
+def _case_fingerprint(test_case: LLMTestCase) -> str:
+    """Returns the canonical JSON of every test case field a judge can look at."""
+    fields = ("input", "actual_output", "expected_output", "context", "retrieval_context")
+    return json.dumps([_normalize(getattr(test_case, f, None)) for f in fields], ensure_ascii=False)
+
+class CachedMetric(BaseMetric):
+    """
+        Wraps a metric so that repeated judge calls on the same test case are served from a cache.
+        Exact matches are looked up in a persistent `diskcache.Cache` keyed on a SHA-256 of the
+        canonicalized test case, metric name, judge model and scoring settings (criteria, evaluation
+        steps and params, rubric, template, strict_mode, include_reason). On a miss, if `similarity_threshold`
+        is set, the test case is embedded with `embedding_model` and compared against the test cases
+        already scored by the same metric against the same `cache_dir` in the current process (FAISS
+        inner product on normalized embeddings); a neighbour with cosine >= `similarity_threshold` is reused.
+        Near-duplicate lookup needs `sentence-transformers` and `faiss`; if either is missing it is
+        turned off (logged once) and only exact matches are cached.
+        Caching is disabled when the judge runs with `temperature > 0`, since its scores are not repeatable.
+        The wrapped metric is copied, so wrappers (and their copies, e.g. by `deepeval.evaluate`)
+        never share score state.
+    """
+
+    # Open caches, encoders and near-duplicate indexes, shared by every wrapper using the same cache_dir
+    _shared_state: Dict[str, Dict[str, Any]] = {}
+    # Whether sentence-transformers and faiss can be imported; None until first checked
+    _near_duplicates_available: Optional[bool] = None
+
+    def __init__(
+            self,
+            metric: BaseMetric,
+            cache_dir: str = "./.deepeval_cache",
+            similarity_threshold: Optional[float] = 0.97,
+            embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+            temperature: float = 0.0
+            ):
+        self.metric = copy.copy(metric)
+        self.include_reason = getattr(metric, "include_reason", False)
+        self.async_mode = getattr(metric, "async_mode", True)
+        self.strict_mode = getattr(metric, "strict_mode", False)
+        self.evaluation_model = getattr(metric, "evaluation_model", None)
+        self.cache_dir = cache_dir
+        self.similarity_threshold = similarity_threshold
+        self.embedding_model = embedding_model
+        self.temperature = temperature
+
+    def __copy__(self):
+        return type(self)(
+            self.metric, self.cache_dir, self.similarity_threshold, self.embedding_model, self.temperature
+        )
+
+    @property
+    def threshold(self):
+        return self.metric.threshold
+
+    @threshold.setter
+    def threshold(self, value):
+        self.metric.threshold = value
+
+    @property
+    def enabled(self) -> bool:
+        return self.temperature <= 0
+
+    @property
+    def __name__(self):
+        return self.metric.__name__
+
+    def _state(self) -> Dict[str, Any]:
+        return self._shared_state.setdefault(
+            os.path.abspath(self.cache_dir), {"cache": None, "encoders": {}, "indexes": {}}
+        )
+
+    def _cache(self):
+        state = self._state()
+        if state["cache"] is None:
+            import diskcache
+            state["cache"] = diskcache.Cache(self.cache_dir)
+        return state["cache"]
+
+    def _index(self) -> Dict[str, Any]:
+        """Near-duplicate index of the test cases scored by this metric: a FAISS index and the cache key of each row."""
+        metric_id = (type(self.metric).__name__, self.__name__, str(self.evaluation_model), self.embedding_model)
+        return self._state()["indexes"].setdefault(metric_id, {"index": None, "keys": []})
+
+    def _scoring_config(self) -> str:
+        """Canonical JSON of the wrapped metric's settings that change its score or reason."""
+        metric = self.metric
+        params = getattr(metric, "evaluation_params", None)
+        template = getattr(metric, "evaluation_template", None)
+        config = {
+            "criteria": getattr(metric, "criteria", None),
+            "evaluation_steps": getattr(metric, "evaluation_steps", None),
+            "evaluation_params": [getattr(p, "value", p) for p in params] if params is not None else None,
+            "rubric": getattr(metric, "rubric", None),
+            "evaluation_template": getattr(template, "__qualname__", template),
+            "strict_mode": getattr(metric, "strict_mode", False),
+            "include_reason": getattr(metric, "include_reason", False),
+        }
+        return json.dumps(config, sort_keys=True, default=str)
+
+    def _key(self, test_case: LLMTestCase) -> str:
+        payload = "\x1e".join((
+            _case_fingerprint(test_case), type(self.metric).__name__, self.__name__,
+            str(self.evaluation_model), self._scoring_config()
+        ))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _near_duplicates_enabled(self) -> bool:
+        if self.similarity_threshold is None:
+            return False
+        if CachedMetric._near_duplicates_available is None:
+            try:
+                import faiss  # noqa: F401
+                import sentence_transformers  # noqa: F401
+                CachedMetric._near_duplicates_available = True
+            except ImportError as e:
+                logger.warning("Near-duplicate judge caching disabled, using exact matches only: %s", e)
+                CachedMetric._near_duplicates_available = False
+        return CachedMetric._near_duplicates_available
+
+    def _embed(self, test_case: LLMTestCase):
+        encoders = self._state()["encoders"]
+        if self.embedding_model not in encoders:
+            from sentence_transformers import SentenceTransformer
+            encoders[self.embedding_model] = SentenceTransformer(self.embedding_model)
+        return encoders[self.embedding_model].encode(
+            [_case_fingerprint(test_case)], normalize_embeddings=True, convert_to_numpy=True
+        ).astype("float32")
+
+    def _lookup(self, test_case: LLMTestCase):
+        """Returns (key, embedding, cached entry or None)."""
+        key = self._key(test_case)
+        if not self.enabled:
+            return key, None, None
+        cached = self._cache().get(key)
+        if cached is not None or not self._near_duplicates_enabled():
+            return key, None, json.loads(cached) if cached is not None else None
+        embedding = self._embed(test_case)
+        neighbours = self._index()
+        index = neighbours["index"]
+        if index is not None and index.ntotal:
+            scores, ids = index.search(embedding, 1)
+            if scores[0][0] >= self.similarity_threshold:
+                cached = self._cache().get(neighbours["keys"][ids[0][0]])
+                if cached is not None:
+                    return key, embedding, json.loads(cached)
+        return key, embedding, None
+
+    def _store(self, key: str, embedding) -> Dict:
+        # Pass/fail is not cached: it depends on the threshold, which may change between runs
+        entry = {"score": self.metric.score, "reason": self.metric.reason}
+        if not self.enabled or self.metric.error is not None or self.metric.score is None:
+            return entry
+        self._cache().set(key, json.dumps(entry))
+        if embedding is not None:
+            neighbours = self._index()
+            if neighbours["index"] is None:
+                import faiss
+                neighbours["index"] = faiss.IndexFlatIP(embedding.shape[1])
+            neighbours["index"].add(embedding)
+            neighbours["keys"].append(key)
+        return entry
+
+    def _apply(self, entry: Dict, from_cache: bool) -> float:
+        if from_cache:
+            # Judge the cached score against the current threshold with the wrapped metric's own semantics
+            self.metric.score, self.metric.reason, self.metric.error = entry["score"], entry["reason"], None
+            self.metric.is_successful()
+        self.score = self.metric.score
+        self.reason = self.metric.reason
+        self.success = self.metric.success
+        self.error = self.metric.error
+        self.evaluation_cost = None if from_cache else self.metric.evaluation_cost
+        return self.score
+
+    def measure(self, test_case: LLMTestCase, *args, **kwargs) -> float:
+        key, embedding, entry = self._lookup(test_case)
+        if entry is not None:
+            return self._apply(entry, from_cache=True)
+        self.metric.measure(test_case, *args, **kwargs)
+        return self._apply(self._store(key, embedding), from_cache=False)
+
+    async def a_measure(self, test_case: LLMTestCase, *args, **kwargs) -> float:
+        key, embedding, entry = self._lookup(test_case)
+        if entry is not None:
+            return self._apply(entry, from_cache=True)
+        await self.metric.a_measure(test_case, *args, **kwargs)
+        return self._apply(self._store(key, embedding), from_cache=False)
+
+    def is_successful(self) -> bool:
+        return self.error is None and bool(self.success)
+
+async def evaluate_case(
+        test_case: LLMTestCase,
+        metrics: Iterable[BaseMetric],
+        metric_max_workers: Optional[int] = None
+        ) -> Dict[str, Dict[str, Any]]:
+    """
+        Runs every metric on a single test case concurrently and returns, by metric name,
+        its `score`, `success`, `reason` and `error`. A failing judge call is recorded in
+        `error` (with `score=None`, `success=False`, `reason=None`) instead of aborting the other metrics.
+        The metrics are copied first, so shared instances (e.g. from `get_metrics`) are never mutated.
+    """
+    # Metrics store their score on the instance, so every evaluation needs its own copies
+    metrics = [copy.copy(m) for m in metrics]
+    semaphore = asyncio.Semaphore(metric_max_workers) if metric_max_workers else None
+
+    async def _measure(metric: BaseMetric):
+        if semaphore is None:
+            return await metric.a_measure(test_case, _show_indicator=False)
+        async with semaphore:
+            return await metric.a_measure(test_case, _show_indicator=False)
+
+    outcomes = await asyncio.gather(*(_measure(m) for m in metrics), return_exceptions=True)
+    results = {}
+    for metric, outcome in zip(metrics, outcomes):
+        error = str(outcome) if isinstance(outcome, BaseException) else metric.error
+        results[metric.__name__] = {
+            "score": None if error is not None else metric.score,
+            "success": False if error is not None else metric.success,
+            "reason": None if error is not None else metric.reason,
+            "error": error,
+        }
+    return results
+
+async def evaluate_cases(
+        test_cases: Sequence[LLMTestCase],
+        metrics: Iterable[BaseMetric],
+        invocation_max_workers: Optional[int] = None,
+        metric_max_workers: Optional[int] = None
+        ) -> List[Dict[str, Dict[str, Any]]]:
+    """
+        Evaluates a batch of test cases, keeping at most `invocation_max_workers` test cases
+        (default: min(len(test_cases), 16)) and `metric_max_workers` judge calls per test case in flight.
+        Results are returned in the same order as `test_cases`.
+    """
+    metrics = list(metrics)
+    if not test_cases:
+        return []
+    semaphore = asyncio.Semaphore(invocation_max_workers or min(len(test_cases), 16))
+
+    async def _evaluate(test_case: LLMTestCase):
+        async with semaphore:
+            return await evaluate_case(test_case, metrics, metric_max_workers)
+
+    return await asyncio.gather(*(_evaluate(tc) for tc in test_cases))
+
+async def dedupe_and_score(
+        test_cases: Sequence[LLMTestCase],
+        metrics: Iterable[BaseMetric],
+        invocation_max_workers: Optional[int] = None,
+        metric_max_workers: Optional[int] = None
+        ) -> List[Dict[str, Dict[str, Any]]]:
+    """
+        Like `evaluate_cases`, but test cases with identical content are scored only once and their
+        results are broadcast back to every duplicate. Two test cases are identical when every judged
+        field matches up to whitespace (see `_case_fingerprint`); contexts split into different list
+        items, or None vs an empty string, are distinct.
+    """
+    keys = [_case_fingerprint(tc) for tc in test_cases]
+    unique_idx = {}
+    for i, key in enumerate(keys):
+        unique_idx.setdefault(key, i)
+    unique_cases = [test_cases[i] for i in unique_idx.values()]
+    results = await evaluate_cases(unique_cases, metrics, invocation_max_workers, metric_max_workers)
+    result_map = dict(zip(unique_idx, results))
+    return [{name: dict(result) for name, result in result_map[key].items()} for key in keys]
+
+if __name__ == "__main__":
+    # Smoke check: the Hallucination metric from get_metrics must reach the judge model in
+    # both measure and a_measure. Uses a stub judge, so no provider call is made.
+    class _StubJudge(DeepEvalBaseLLM):
+        def __init__(self):
+            self.calls = 0
+
+        def load_model(self):
+            return self
+
+        def generate(self, prompt, schema=None):
+            self.calls += 1
+            payload = {"verdicts": [{"verdict": "yes", "reason": "The output agrees with the context."}], "reason": "ok"}
+            if schema is None:
+                return json.dumps(payload)
+            return schema(**{k: v for k, v in payload.items() if k in schema.model_fields})
+
+        async def a_generate(self, prompt, schema=None):
+            return self.generate(prompt, schema)
+
+        def get_model_name(self):
+            return "stub-judge"
+
+    test_case = LLMTestCase(input="Where is Paris?", actual_output="Paris is in France.", context=["Paris is in France."])
+    judge = _StubJudge()
+    hallucination = get_metrics(model=judge)[-1]
+    for run in ("measure", "a_measure"):
+        metric = copy.copy(hallucination)
+        calls = judge.calls
+        if run == "measure":
+            metric.measure(test_case, _show_indicator=False)
+        else:
+            asyncio.run(metric.a_measure(test_case, _show_indicator=False))
+        assert metric.error is None, metric.error
+        assert judge.calls > calls, f"{run} never called the judge"
+        assert metric.score == 1 and metric.success, (metric.score, metric.success)
+        print(f"{type(metric).__name__}.{run}: score={metric.score} success={metric.success}")
@@ -1,61 +1,110 @@
+import os
 import pandas as pd
 import numpy as np
+from functools import reduce
+from types import MappingProxyType
 
-def generate_full_latex_table(csv_path):
+# Printable names, built once and read-only
+_PROMPT_MAPPING = MappingProxyType({
+    'current_user_template.txt': 'P1',
+    'previous_user_template.txt': 'P2'
+})
+
+_MODEL_NAME_MAPPING = MappingProxyType({
+    'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_15_FLASH': 'Gemini 1.5 Flash',
+    'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_15_PRO': 'Gemini 1.5 Pro',
+    'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_2_FLASH': 'Gemini 2.0 Flash',
+    'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_2_FLASH_LITE': 'Gemini 2.0 Flash Lite',
+    'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_25_PRO': 'Gemini 2.5 Pro',
+    'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_25_FLASH': 'Gemini 2.5 Flash',
+    'GENAI_SHARED_VERTEXAI_ANTHROPIC_CLAUDE_35_SONNET': 'Claude 3.5 Sonnet',
+    'GENAI_SHARED_VERTEXAI_ANTHROPIC_CLAUDE_35_SONNET_V2': 'Claude 3.5 Sonnet v2',
+    'GENAI_SHARED_VERTEXAI_ANTHROPIC_CLAUDE_37_SONNET': 'Claude 3.7 Sonnet',
+    'GENAI_SHARED_VERTEXAI_ANTHROPIC_CLAUDE_4_SONNET': 'Claude 4.0 Sonnet',
+    'GENAI_SHARED_BEDROCK_ANTHROPIC_CLAUDE_3_HAIKU': 'Claude 3 Haiku',
+    'GENAI_SHARED_AZURE_OPENAI_GPT_4_OMNI': 'GPT-4 Omni',
+    'GENAI_SHARED_AZURE_OPENAI_GPT_4_OMNI_2024_20_11': 'GPT-4 Omni (2024-11-20)',
+    'GENAI_SHARED_AZURE_OPENAI_GPT_4_OMNI_MINI': 'GPT-4 Omni Mini',
+    'GENAI_SHARED_AZURE_OPENAI_GPT_41_NANO': 'GPT-4.1 Nano',
+    'GENAI_SHARED_AZURE_OPENAI_GPT_41': 'GPT-4.1',
+    'GENAI_SHARED_AZURE_OPENAI_O1_MINI': 'O1 Mini',
+    'GENAI_SHARED_AZURE_OPENAI_O1': 'O1',
+    'GENAI_SHARED_AZURE_OPENAI_O3': 'O3',
+    'GENAI_SHARED_AZURE_OPENAI_O3_MINI': 'O3 Mini',
+    'GENAI_SHARED_AZURE_OPENAI_O4_MINI': 'O4 Mini',
+    'GENAI_SHARED_AZURE_OPENAI_TEXT_ADA_002': 'Ada-002',
+    'GENAI_SHARED_AZURE_OPENAI_TEXT_EMBEDDING_003_LARGE': 'Embedding-003 Large',
+    'GENAI_SHARED_BEDROCK_AMAZON_TITAN_EMBED_TEXT_V1': 'Titan Embed v1',
+    'GENAI_SHARED_VERTEXAI_GOOGLE_TEXTEMBEDDING_GECKO': 'Gecko'
+})
+
+# One LaTeX row: model & prompt & temp & avg scores & total & GPT-4o scores & Claude scores
+_ROW_TEMPLATE = "{} & {} & {} & {} & {} & {} & {} \\\\\n".format
+
+# Above this many hundredths values are formatted with printf instead of the lookup table
+_MAX_TABLE_CENTS = 1_000_000
+
+def _format_2f(values):
     """
-    Parses a CSV file with detailed evaluation results and generates a
-    multi-page, rotated LaTeX longtable, preserving the original structure
-    but reordering metrics and sorting by model → prompt → temperature.
+    Formats floats exactly like '%.2f'. Values are rounded to integer hundredths
+    and looked up in a table of pre-formatted strings, so printf runs once per
+    distinct magnitude rather than once per cell. Values where that rounding may
+    differ from printf's (half-cent ties), non-finite values and values beyond the
+    table are formatted with printf directly.
     """
-    try:
-        df = pd.read_csv(csv_path)
-    except FileNotFoundError:
-        return f"Error: The file at {csv_path} was not found."
-    except Exception as e:
-        return f"An error occurred while reading the CSV file: {e}"
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    scaled = np.abs(np.where(finite, values, 0.0)) * 100
+    rounded = np.rint(scaled)
+    tabled = finite & (scaled <= _MAX_TABLE_CENTS) & (np.abs(np.abs(scaled - rounded) - 0.5) > 1e-6)
+    cents = np.where(tabled, rounded, 0).astype(np.int64)
+    out = np.char.mod('%.2f', np.arange(int(cents.max(initial=0)) + 1) / 100)[cents]
+    negative = tabled & np.signbit(values)
+    if negative.any():
+        out = out.astype(np.result_type(out, np.dtype('<U1')))
+        out = np.where(negative, np.char.add('-', out), out)
+    if not tabled.all():
+        patched = np.char.mod('%.2f', values[~tabled])
+        out = out.astype(np.result_type(out, patched))
+        out[~tabled] = patched
+    return out
 
-    # --- 0. Rename and drop unmapped prompts ---
-    df.rename(columns={'Configuration': 'Model'}, inplace=True)
-    prompt_mapping = {
-        'current_user_template.txt': 'P1',
-        'previous_user_template.txt': 'P2'
-    }
-    df = df[df['Prompt'].isin(prompt_mapping)]
-    df['Prompt'] = df['Prompt'].map(prompt_mapping)
-
-    # --- 1. Map models and sort ---
-    model_name_mapping = {
-        'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_15_FLASH': 'Gemini 1.5 Flash',
-        'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_15_PRO': 'Gemini 1.5 Pro',
-        'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_2_FLASH': 'Gemini 2.0 Flash',
-        'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_2_FLASH_LITE': 'Gemini 2.0 Flash Lite',
-        'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_25_PRO': 'Gemini 2.5 Pro',
-        'GENAI_SHARED_VERTEXAI_GOOGLE_GEMINI_25_FLASH': 'Gemini 2.5 Flash',
-        'GENAI_SHARED_VERTEXAI_ANTHROPIC_CLAUDE_35_SONNET': 'Claude 3.5 Sonnet',
-        'GENAI_SHARED_VERTEXAI_ANTHROPIC_CLAUDE_35_SONNET_V2': 'Claude 3.5 Sonnet v2',
-        'GENAI_SHARED_VERTEXAI_ANTHROPIC_CLAUDE_37_SONNET': 'Claude 3.7 Sonnet',
-        'GENAI_SHARED_VERTEXAI_ANTHROPIC_CLAUDE_4_SONNET': 'Claude 4.0 Sonnet',
-        'GENAI_SHARED_BEDROCK_ANTHROPIC_CLAUDE_3_HAIKU': 'Claude 3 Haiku',
-        'GENAI_SHARED_AZURE_OPENAI_GPT_4_OMNI': 'GPT-4 Omni',
-        'GENAI_SHARED_AZURE_OPENAI_GPT_4_OMNI_2024_20_11': 'GPT-4 Omni (2024-11-20)',
-        'GENAI_SHARED_AZURE_OPENAI_GPT_4_OMNI_MINI': 'GPT-4 Omni Mini',
-        'GENAI_SHARED_AZURE_OPENAI_GPT_41_NANO': 'GPT-4.1 Nano',
-        'GENAI_SHARED_AZURE_OPENAI_GPT_41': 'GPT-4.1',
-        'GENAI_SHARED_AZURE_OPENAI_O1_MINI': 'O1 Mini',
-        'GENAI_SHARED_AZURE_OPENAI_O1': 'O1',
-        'GENAI_SHARED_AZURE_OPENAI_O3': 'O3',
-        'GENAI_SHARED_AZURE_OPENAI_O3_MINI': 'O3 Mini',
-        'GENAI_SHARED_AZURE_OPENAI_O4_MINI': 'O4 Mini',
-        'GENAI_SHARED_AZURE_OPENAI_TEXT_ADA_002': 'Ada-002',
-        'GENAI_SHARED_AZURE_OPENAI_TEXT_EMBEDDING_003_LARGE': 'Embedding-003 Large',
-        'GENAI_SHARED_BEDROCK_AMAZON_TITAN_EMBED_TEXT_V1': 'Titan Embed v1',
-        'GENAI_SHARED_VERTEXAI_GOOGLE_TEXTEMBEDDING_GECKO': 'Gecko'
-    }
-    # Create column with printable name, sort by model→prompt→temp
-    df['MappedModel'] = df['Model'].map(model_name_mapping).fillna(df['Model'])
-    df.sort_values(['MappedModel', 'Prompt', 'Temperature'], inplace=True)
+def _join_cells(cells):
+    """Joins the columns of a 2-D string array with ' & ', one vectorized op per column."""
+    return reduce(lambda acc, col: np.char.add(np.char.add(acc, ' & '), col), cells.T)
+
+def _sort_codes(col):
+    """Category codes of `col` as sort keys, with missing values (-1) placed last."""
+    codes = col.cat.codes.to_numpy()
+    return np.where(codes < 0, len(col.cat.categories), codes)
+
+def _format_rows(labels, temps, score_mat, n):
+    """
+    Formats a block of table rows and returns them as a single string.
+    `labels` holds (model, prompt) per row and `score_mat` the n Avg, n GPT-4o
+    and n Claude scores; the total is the sum of the Avg block.
+    """
+    models = np.char.replace(labels[:, 0].astype(str), '_', r'\_')
+    prompts = labels[:, 1].astype(str)
+    temps = np.where(np.isnan(temps), '-', np.char.mod('%.1f', temps))
+    scores = _format_2f(score_mat)
+    avg_vals    = _join_cells(scores[:, :n])
+    total       = _format_2f(np.nansum(score_mat[:, :n], axis=1))
+    g4o_vals    = _join_cells(scores[:, n:2 * n])
+    claude_vals = _join_cells(scores[:, 2 * n:])
+    return "".join(map(_ROW_TEMPLATE, models, prompts, temps, avg_vals, total, g4o_vals, claude_vals))
 
-    # --- 2. Metrics setup ---
+def generate_full_latex_table(csv_path, out_file, n_jobs=1, chunk_size=10_000):
+    """
+    Parses a CSV file with detailed evaluation results and writes a
+    multi-page, rotated LaTeX longtable to the file object `out_file`,
+    preserving the original structure but reordering metrics and sorting
+    by model → prompt → temperature.
+    Rows are formatted in chunks of `chunk_size`; with `n_jobs` != 1 the
+    chunks are formatted in parallel with joblib (-1 uses all cores).
+    Returns None on success, or an error message if the CSV can't be read.
+    """
+    # --- 0. Metrics setup (also determines which CSV columns are needed) ---
     metric_order = {
         'Answer Relevancy': 'AR',
         'Correctness': 'C',
@@ -69,12 +118,54 @@ def generate_full_latex_table(csv_path):
     avg_cols    = [f"{m} (Avg)"      for m in metrics]
     gpt4o_cols  = [f"{m} (GPT-4o)"    for m in metrics]
     claude_cols = [f"{m} (Sonnet3.5)" for m in metrics]
+    needed_cols = ['Configuration', 'Prompt', 'Temperature'] + avg_cols + gpt4o_cols + claude_cols
 
-    df['Sum'] = df[avg_cols].sum(axis=1)
+    # --- 1. Read only the needed columns, with dtypes fixed at parse time ---
+    # The pyarrow engine decodes the CSV multi-threaded; strings go straight to categoricals.
+    try:
+        df = pd.read_csv(
+            csv_path,
+            engine='pyarrow',
+            usecols=needed_cols,
+            dtype={'Prompt': 'category', 'Configuration': 'category', 'Temperature': 'float64'}
+        )
+    except FileNotFoundError:
+        return f"Error: The file at {csv_path} was not found."
+    except Exception as e:
+        return f"An error occurred while reading the CSV file: {e}"
+
+    # --- 2. Drop unmapped prompts, map prompts and models, sort ---
+    # Prompts outside the mapping become NaN and are dropped in the same pass
+    df['Prompt'] = df['Prompt'].cat.set_categories(list(_PROMPT_MAPPING)).cat.rename_categories(_PROMPT_MAPPING)
+    df = df.dropna(subset=['Prompt'])
+
+    # Create column with printable name: renaming categories is O(#models), not O(#rows).
+    # Unmapped models keep their raw name; categories are kept alphabetical for the sort below.
+    categories = df['Configuration'].cat.categories
+    names = pd.Index([_MODEL_NAME_MAPPING.get(c, c) for c in categories])
+    if names.is_unique:
+        mapped = df['Configuration'].cat.rename_categories(names)
+    else:
+        # Both a raw name and its printable name occur: merge them by recoding the rows
+        mapped = df['Configuration'].map(dict(zip(categories, names))).astype('category')
+    df['MappedModel'] = mapped.cat.reorder_categories(sorted(mapped.cat.categories), ordered=True)
+    df['Prompt'] = df['Prompt'].cat.as_ordered()
+    # Sort on the integer category codes (stable; NaN last, as sort_values does)
+    order = np.lexsort((
+        df['Temperature'].to_numpy(),
+        _sort_codes(df['Prompt']),
+        _sort_codes(df['MappedModel'])
+    ))
+    df = df.iloc[order]
+
+    # All scores as one contiguous (n_rows, 3 * n) block: Avg | GPT-4o | Claude
+    labels = df[['MappedModel', 'Prompt']].to_numpy()
+    temps = df['Temperature'].to_numpy(dtype=np.float64)
+    score_mat = df[avg_cols + gpt4o_cols + claude_cols].to_numpy(dtype=np.float64)
 
     # --- 3. Build LaTeX longtable ---
     header_abbr = " & ".join(f"\\textbf{{{a}}}" for a in abbrevs)
-    latex = fr"""
+    preamble = fr"""
 % Requires in preamble:
 %   \usepackage{{lscape,longtable,booktabs,adjustbox}}  % adjustbox only if you use method 2
 \begin{{landscape}}
@@ -110,29 +201,42 @@ def generate_full_latex_table(csv_path):
 \endlastfoot
 """
 
-    for _, r in df.iterrows():
-        m = str(r['MappedModel']).replace('_', r'\_')
-        p = r['Prompt']
-        t = f"{r['Temperature']:.1f}" if pd.notna(r['Temperature']) else '-'
-        avg_vals    = " & ".join(f"{r[c]:.2f}" for c in avg_cols)
-        g4o_vals    = " & ".join(f"{r[c]:.2f}" for c in gpt4o_cols)
-        claude_vals = " & ".join(f"{r[c]:.2f}" for c in claude_cols)
-        total       = f"{r['Sum']:.2f}"
-        latex += f"{m} & {p} & {t} & {avg_vals} & {total} & {g4o_vals} & {claude_vals} \\\\\n"
-
-    latex += r"""\end{longtable}
+    # Format rows chunk by chunk on the underlying ndarrays instead of iterating Series
+    n = len(avg_cols)
+    chunks = [
+        (labels[i:i + chunk_size], temps[i:i + chunk_size], score_mat[i:i + chunk_size])
+        for i in range(0, len(score_mat), chunk_size)
+    ]
+    if n_jobs == 1:
+        parts = (_format_rows(*c, n) for c in chunks)
+    else:
+        from joblib import Parallel, delayed
+        # Parallel returns results in submission order, so rows stay sorted
+        parts = Parallel(n_jobs=n_jobs)(delayed(_format_rows)(*c, n) for c in chunks)
+    out_file.write(preamble)
+    out_file.writelines(parts)
+
+    footer = r"""\end{longtable}
 \end{adjustbox}      % close Method 2
 \end{landscape}
 """
-    return latex
+    out_file.write(footer)
 
 if __name__ == "__main__":
     csv_file_path = 'macro_evaluation_results.csv'
     output_filename = 'latex_table.txt'
-    latex_output = generate_full_latex_table(csv_file_path)
+    # Write next to the target and rename on success, so a failed run leaves the old table intact
+    tmp_filename = output_filename + '.tmp'
     try:
-        with open(output_filename, 'w', encoding='utf-8') as f:
-            f.write(latex_output)
-        print(f"LaTeX table successfully saved to {output_filename}")
+        with open(tmp_filename, 'w', encoding='utf-8', buffering=1 << 20) as f:
+            error = generate_full_latex_table(csv_file_path, f)
+        if error:
+            print(error)
+        else:
+            os.replace(tmp_filename, output_filename)
+            print(f"LaTeX table successfully saved to {output_filename}")
     except IOError as e:
-        print(f"An error occurred while writing to the file: {e}")
\ No newline at end of file
+        print(f"An error occurred while writing to the file: {e}")
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)